@@ -1,48 +1,40 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, send_file
 from flask_cors import CORS
-import subprocess
 import os
-import re
+import queue
 import time
-import json
 import requests
 
+from backlog import BacklogWorker, scan_srt_files
+from jobs import JobQueue, sse
+
 app = Flask(__name__)
 CORS(app)
 
 # Configuración
 MEDIA_MOUNT = '/mnt/media'
+LIBRARY_PATHS = [os.path.join(MEDIA_MOUNT, 'Series'), os.path.join(MEDIA_MOUNT, 'Movies')]
 TRANSLATE_SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), './translate.sh'))
 OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'http://127.0.0.1:11434')
+HEARTBEAT_SECONDS = 15
+BACKLOG_STATE = os.getenv('BACKLOG_STATE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backlog_state.json'))
+
+# Traducciones lanzadas desde la UI: se agrupan por modelo; el backlog cede la GPU mientras haya alguna
+jobs = JobQueue(OLLAMA_HOST, os.path.dirname(TRANSLATE_SCRIPT))
+backlog = BacklogWorker(LIBRARY_PATHS, TRANSLATE_SCRIPT, OLLAMA_HOST, BACKLOG_STATE, is_busy=jobs.busy)
 
 # ==================== LISTAR ARCHIVOS .SRT ====================
 @app.route('/api/files', methods=['GET'])
 def list_files():
     start_time = time.time()
     try:
-        base_paths = [
-            os.path.join(MEDIA_MOUNT, 'Series'),
-            os.path.join(MEDIA_MOUNT, 'Movies')
-        ]
         # Usar 'find' nativo es mucho más rápido que os.walk sobre NFS
-        existing_paths = [p for p in base_paths if os.path.exists(p)]
+        paths, existing_paths = scan_srt_files(LIBRARY_PATHS)
         if not existing_paths:
             return jsonify([])
 
-        cmd = ['find'] + existing_paths + [
-            '-name', '*.srt', '-type', 'f',
-            '-not', '-path', '*/#recycle/*',
-            '-not', '-path', '*/Temp/*',
-            '-not', '-path', '*/Tools/*',
-            '-not', '-path', '*/PersonalVideos/*'
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        
         srt_files = []
-        for line in result.stdout.strip().split('\n'):
-            if not line:
-                continue
-            full_path = line.strip()
+        for full_path in paths:
             file_name = os.path.basename(full_path)
             rel_path = os.path.relpath(full_path, MEDIA_MOUNT)
             srt_files.append({
@@ -91,11 +83,16 @@ def translate():
     model = request.args.get('model', 'gemma4:latest')
     test_str = request.args.get('test')
     test = int(test_str) if test_str else None
+    previous = request.args.get('previous', '')
+    previous_target = request.args.get('previous_target', '')
+    trace = request.args.get('trace', '') in ('1', 'true')
 
     if not file_path or not lang:
         return 'Faltan parámetros path o lang', 400
     if not os.path.exists(file_path):
         return 'Archivo no encontrado', 404
+    if previous and not os.path.exists(previous):
+        return 'Archivo previo no encontrado', 404
 
     cmd = ['bash', '-u', TRANSLATE_SCRIPT, file_path, '--lang', lang]
     if model != 'gemma4:latest':
@@ -104,65 +101,131 @@ def translate():
         cmd.extend(['--context', context.strip()])
     if test is not None:
         cmd.extend(['--test', str(test)])
+    # Modo diff: solo se re-traducen las líneas nuevas o modificadas
+    if previous:
+        cmd.extend(['--diff-from', previous])
+        if previous_target:
+            cmd.extend(['--previous-target', previous_target])
+
+    job = jobs.submit(cmd, file_path, lang, model, trace)
+    print(f"📥 Trabajo {job.id} en cola: {os.path.basename(file_path)} → {lang} ({model})")
 
+    return stream_job(job)
+
+
+def stream_job(job):
     def generate():
+        events = jobs.subscribe(job)
         try:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True,
-                cwd=os.path.dirname(TRANSLATE_SCRIPT)
-            )
-
-            # Eventos iniciales inmediatos
-            print("Traducción iniciada con Ollama...")
-            yield f"data: {json.dumps({'type': 'log', 'message': 'Traducción iniciada con Ollama...'})}\n\n"
-            print("Progreso: 0%")
-            yield f"data: {json.dumps({'type': 'progress', 'percent': 0})}\n\n"
-
-            # Bucle único para leer todo el output en tiempo real
-            for line in process.stdout:
-                line = line.rstrip('\n')
-                if line:
-                    print(line)
-                    yield f"data: {json.dumps({'type': 'log', 'message': line})}\n\n"
-
-                    match = re.search(r'(\d+)%\|', line)
-                    if match:
-                        percent = int(match.group(1))
-                        print(f"Progreso: {percent}%")
-                        yield f"data: {json.dumps({'type': 'progress', 'percent': percent})}\n\n"
-
-            process.wait()
-
-            if process.returncode == 0:
-                dir_name = os.path.dirname(file_path)
-                base_name = os.path.basename(file_path)
-                output_name = re.sub(r'\.([a-z]{2})(?:\.[^.]+)?\.srt$', f'.{lang}.srt', base_name, flags=re.IGNORECASE)
-                if output_name == base_name:
-                    output_name = base_name.replace('.srt', f'.{lang}.srt')
-                output_path = os.path.join(dir_name, output_name)
-
-                print('¡Traducción completada!')
-                yield f"data: {json.dumps({'type': 'log', 'message': '¡Traducción completada!'})}\n\n"
-                print('Progreso: 100%')
-                yield f"data: {json.dumps({'type': 'progress', 'percent': 100})}\n\n"
-                print(f'Archivo generado: {output_path}')
-                yield f"data: {json.dumps({'type': 'complete', 'output_file': output_path})}\n\n"
-            else:
-                print(f"Falló con código {process.returncode}")
-                yield f"data: {json.dumps({'type': 'error', 'message': f'Falló con código {process.returncode}'})}\n\n"
-
-        except Exception as e:
-            print(f"Error: {e}")
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            while True:
+                try:
+                    event = events.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # Comentario SSE: si el cliente se fue, escribirlo falla y saltamos al finally
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    break
+                yield sse(event)
+        finally:
+            # Pestaña cerrada / EventSource cerrado: si no queda nadie mirando, se cancela el trabajo
+            jobs.unsubscribe(job, events)
 
     # ¡ESTA LÍNEA ES OBLIGATORIA!
     return Response(generate(), mimetype='text/event-stream')
 
+# ==================== TRABAJOS EN COLA ====================
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify(jobs.list())
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return 'Trabajo no encontrado', 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return 'Trabajo no encontrado', 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return 'Trabajo no encontrado', 404
+    return stream_job(job)
+
+
+@app.route('/api/jobs/<job_id>/trace', methods=['GET'])
+def get_job_trace(job_id):
+    job = jobs.get(job_id)
+    if job is None or not job.trace_path or not os.path.exists(job.trace_path):
+        return 'Traza no disponible', 404
+    return send_file(job.trace_path, mimetype='application/json', as_attachment=True,
+                     download_name=f'trace-job-{job.id}.json')
+
+
+# ==================== BACKLOG DE LA BIBLIOTECA ====================
+@app.route('/api/backlog', methods=['GET'])
+def get_backlog():
+    langs = [l for l in request.args.get('lang', '').split(',') if l] or None
+    start_time = time.time()
+    try:
+        items = backlog.pending(langs)
+        elapsed = time.time() - start_time
+        print(f"🗂️  Backlog calculado: {len(items)} pendientes ({elapsed:.2f}s)")
+        return jsonify(items)
+    except Exception as e:
+        print(f"❌ Error calculando backlog: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/backlog/status', methods=['GET'])
+def backlog_status():
+    return jsonify(backlog.snapshot())
+
+
+@app.route('/api/backlog/start', methods=['POST'])
+def backlog_start():
+    data = request.get_json(silent=True) or {}
+    langs = data.get('langs')
+    hours = data.get('hours')
+    model = data.get('model')
+    if isinstance(langs, str):
+        langs = [l for l in langs.split(',') if l]
+    if langs is not None and not (isinstance(langs, list) and all(isinstance(l, str) for l in langs)):
+        return 'langs debe ser una lista o "ja,es"', 400
+    if hours is not None and not isinstance(hours, str):
+        return 'Formato de horario inválido (HH:MM-HH:MM)', 400
+    if model is not None and not isinstance(model, str):
+        return 'model debe ser un texto', 400
+    try:
+        backlog.start(langs=langs, hours=hours, model=model)
+    except ValueError:
+        return 'Formato de horario inválido (HH:MM-HH:MM)', 400
+    return jsonify(backlog.snapshot())
+
+
+@app.route('/api/backlog/retry', methods=['POST'])
+def backlog_retry():
+    backlog.retry_failed()
+    return jsonify(backlog.snapshot())
+
+
+@app.route('/api/backlog/stop', methods=['POST'])
+def backlog_stop():
+    backlog.stop()
+    return jsonify(backlog.snapshot())
+
+
 # ==================== LEER README ====================
 @app.route('/api/readme', methods=['GET'])
 def get_readme():
@@ -181,4 +244,7 @@ if __name__ == '__main__':
     print(f"Media mount: {MEDIA_MOUNT}")
     print(f"Translate script: {TRANSLATE_SCRIPT}")
     print(f"Ollama host: {OLLAMA_HOST}")
+    # Con debug=True el reloader arranca dos procesos; el worker solo en el que sirve peticiones
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        backlog.resume_if_enabled()
     app.run(host='0.0.0.0', port=5001, debug=True)
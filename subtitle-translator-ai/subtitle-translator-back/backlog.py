@@ -0,0 +1,431 @@
+"""
+Backlog de la biblioteca: qué subtítulos origen no tienen todavía un idioma
+destino, y un worker en segundo plano que los va traduciendo con la mínima
+prioridad, dentro de un horario y cediendo la GPU a las traducciones manuales.
+"""
+
+import json
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+
+import requests
+
+from subtitle_translator import DEFAULT_MODEL, extract_language_from_filename, generate_output_filename
+
+EXCLUDED_PATHS = ['*/#recycle/*', '*/Temp/*', '*/Tools/*', '*/PersonalVideos/*']
+
+
+def scan_srt_files(base_paths):
+    """Lista todos los .srt bajo base_paths usando 'find' (mucho más rápido que os.walk sobre NFS)."""
+    existing_paths = [p for p in base_paths if os.path.exists(p)]
+    if not existing_paths:
+        return [], existing_paths
+
+    cmd = ['find'] + existing_paths + ['-name', '*.srt', '-type', 'f']
+    for pattern in EXCLUDED_PATHS:
+        cmd += ['-not', '-path', pattern]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    paths = [line.strip() for line in result.stdout.strip().split('\n') if line.strip()]
+    return paths, existing_paths
+
+
+def compute_backlog(srt_paths, target_langs, source_langs):
+    """
+    Para cada subtítulo origen (idioma en source_langs) y cada idioma destino,
+    comprueba si ya existe el fichero que generaría generate_output_filename.
+    La existencia se resuelve contra el propio listado, sin stat() por fichero.
+    """
+    existing = set(srt_paths)
+    source_langs = [lang.lower() for lang in source_langs]
+    # Si varios orígenes generan la misma salida (.en.srt / .en.sdh.srt), gana el nombre más corto
+    candidates = sorted(srt_paths, key=lambda p: (len(os.path.basename(p)), p))
+
+    pending = {}
+    for path in candidates:
+        source_lang = extract_language_from_filename(os.path.basename(path)).lower()
+        if source_lang not in source_langs:
+            continue
+        for lang in target_langs:
+            if lang == source_lang:
+                continue
+            output_path = generate_output_filename(path, lang)
+            if output_path in existing or output_path in pending:
+                continue
+            pending[output_path] = {'source': path, 'lang': lang, 'output': output_path}
+
+    return sorted(pending.values(), key=lambda item: (item['source'].lower(), item['lang']))
+
+
+def parse_hours(hours):
+    """'01:00-07:00' -> (60, 420) en minutos; vacío = sin restricción horaria."""
+    if not hours:
+        return None
+    start, end = hours.split('-')
+
+    def to_minutes(value):
+        h, _, m = value.strip().partition(':')
+        h, m = int(h), int(m or 0)
+        if not (0 <= h <= 24 and 0 <= m < 60):
+            raise ValueError(f"hora fuera de rango: {value!r}")
+        return h * 60 + m
+
+    return to_minutes(start), to_minutes(end)
+
+
+def within_hours(window, now=None):
+    if window is None:
+        return True
+    now = now or time.localtime()
+    minutes = now.tm_hour * 60 + now.tm_min
+    start, end = window
+    if start <= end:
+        return start <= minutes < end
+    # Ventana que cruza la medianoche (p. ej. 22:00-06:00)
+    return minutes >= start or minutes < end
+
+
+class BacklogWorker:
+    """
+    Drena el backlog fichero a fichero en un hilo daemon. El estado (activo,
+    fallidos, fichero en curso) se guarda en disco, así que tras un reinicio
+    se retoma solo: lo ya traducido desaparece del backlog al existir la salida.
+    """
+
+    POLL_SECONDS = 5
+    IDLE_SECONDS = 60
+    ERROR_BACKOFF_SECONDS = 300
+    RESCAN_SECONDS = 1800
+    # Fallos seguidos de un mismo fichero (con Ollama disponible) antes de darlo por fallido
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, base_paths, translate_script, ollama_host, state_path, is_busy=None):
+        self.base_paths = base_paths
+        self.translate_script = translate_script
+        self.ollama_host = ollama_host
+        self.state_path = state_path
+        self.is_busy = is_busy or (lambda: False)
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.queue = []
+        self.last_scan = 0
+        self.process = None
+        self.paused = False
+        self.status = 'stopped'
+        self.current = None
+        self.progress = 0
+        self.last_error = None
+
+        # Un BACKLOG_HOURS mal escrito debe fallar al arrancar, no matar el worker más tarde
+        try:
+            parse_hours(os.getenv('BACKLOG_HOURS', ''))
+        except ValueError:
+            raise ValueError(f"BACKLOG_HOURS inválido: {os.getenv('BACKLOG_HOURS')!r} (formato HH:MM-HH:MM)")
+
+        self.state = {
+            'enabled': False,
+            'langs': [l for l in os.getenv('BACKLOG_LANGS', 'ja,es').split(',') if l],
+            'source_langs': [l for l in os.getenv('BACKLOG_SOURCE_LANGS', 'en').split(',') if l],
+            'hours': os.getenv('BACKLOG_HOURS', ''),
+            'model': os.getenv('BACKLOG_MODEL', DEFAULT_MODEL),
+            'current': None,
+            'done': 0,
+            'attempts': {},
+            'failed': {},
+        }
+        self._load_state()
+        try:
+            parse_hours(self.state['hours'])
+        except (ValueError, AttributeError):
+            print(f"⚠️  Horario guardado inválido ({self.state['hours']!r}), se usa BACKLOG_HOURS")
+            self.state['hours'] = os.getenv('BACKLOG_HOURS', '')
+
+    # ---------- estado persistente ----------
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️  Estado del backlog ilegible ({self.state_path}): {e}")
+
+    def _save_state(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    # ---------- control ----------
+    def resume_if_enabled(self):
+        if self.state['enabled']:
+            print(f"🔁 Reanudando backlog (en curso al parar: {self.state['current']})")
+            self.start()
+
+    def start(self, langs=None, hours=None, model=None):
+        with self.lock:
+            if langs:
+                self.state['langs'] = langs
+            if hours is not None:
+                parse_hours(hours)
+                self.state['hours'] = hours
+            if model:
+                self.state['model'] = model
+            self.state['enabled'] = True
+            self._save_state()
+            self.queue = []
+            self.last_scan = 0
+
+        if self.thread and self.thread.is_alive():
+            if not self.stop_event.is_set():
+                return
+            # Se acaba de parar: esperar a que el hilo anterior termine antes de relanzar
+            self.thread.join()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='backlog-worker', daemon=True)
+        self.thread.start()
+
+    def retry_failed(self):
+        """Vuelve a meter en el backlog los ficheros dados por fallidos."""
+        with self.lock:
+            count = len(self.state['failed'])
+            self.state['failed'] = {}
+            self.state['attempts'] = {}
+            self._save_state()
+            self.queue = []
+            self.last_scan = 0
+        print(f"🔁 Backlog: {count} fallidos vuelven a la cola")
+
+    def stop(self):
+        with self.lock:
+            self.state['enabled'] = False
+            self._save_state()
+        self.stop_event.set()
+        self._terminate()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'status': self.status,
+                'current': self.current,
+                'progress': self.progress,
+                'last_error': self.last_error,
+                'queued': len(self.queue),
+                'enabled': self.state['enabled'],
+                'langs': self.state['langs'],
+                'source_langs': self.state['source_langs'],
+                'hours': self.state['hours'],
+                'model': self.state['model'],
+                'done': self.state['done'],
+                'attempts': self.state['attempts'],
+                'failed': self.state['failed'],
+            }
+
+    def pending(self, langs=None):
+        paths, _ = scan_srt_files(self.base_paths)
+        return compute_backlog(paths, langs or self.state['langs'], self.state['source_langs'])
+
+    # ---------- throttling ----------
+    def gpu_busy(self):
+        """Hay una traducción manual en marcha, u Ollama tiene cargado otro modelo que no es el del backlog."""
+        if self.is_busy():
+            return True
+        try:
+            response = requests.get(f'{self.ollama_host}/api/ps', timeout=5)
+            loaded = [m.get('name', '') for m in response.json().get('models', [])]
+            return any(name != self.state['model'] for name in loaded)
+        except Exception:
+            return False
+
+    def ollama_problem(self):
+        """Motivo por el que Ollama no puede traducir ahora (caído, dormido, sin el modelo), o None."""
+        try:
+            response = requests.get(f'{self.ollama_host}/api/tags', timeout=5)
+            response.raise_for_status()
+            models = [m.get('name', '') for m in response.json().get('models', [])]
+        except Exception as e:
+            return f"Ollama no responde: {e}"
+        if self.state['model'] not in models:
+            return f"Modelo no disponible en Ollama: {self.state['model']}"
+        return None
+
+    def _set_status(self, status):
+        with self.lock:
+            self.status = status
+
+    # ---------- bucle principal ----------
+    def _run(self):
+        print("🗂️  Worker de backlog iniciado")
+        while not self.stop_event.is_set():
+            try:
+                self._step()
+            except Exception as e:
+                # find con timeout sobre NFS, estado ilegible, Popen... se reintenta tras una pausa
+                print(f"❌ Error en el worker de backlog: {e}")
+                self._terminate()
+                with self.lock:
+                    self.status = 'error'
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    self.current = None
+                    self.process = None
+                    self.paused = False
+                self.stop_event.wait(self.ERROR_BACKOFF_SECONDS)
+
+        self._set_status('stopped')
+        print("🗂️  Worker de backlog detenido")
+
+    def _step(self):
+        if not within_hours(parse_hours(self.state['hours'])):
+            self._set_status('outside_hours')
+            self.stop_event.wait(self.IDLE_SECONDS)
+            return
+        if self.gpu_busy():
+            self._set_status('throttled')
+            self.stop_event.wait(self.POLL_SECONDS * 6)
+            return
+        problem = self.ollama_problem()
+        if problem:
+            self._wait_for_ollama(problem)
+            return
+
+        item = self._next_item()
+        if item is None:
+            self._set_status('idle')
+            self.stop_event.wait(self.IDLE_SECONDS)
+            return
+        returncode = self._translate(item)
+        if returncode == 0:
+            with self.lock:
+                self.last_error = None
+        elif not self.stop_event.is_set():
+            self._record_failure(item, returncode)
+            self.stop_event.wait(self.ERROR_BACKOFF_SECONDS)
+
+    def _wait_for_ollama(self, problem):
+        print(f"⏳ Backlog en espera: {problem}")
+        with self.lock:
+            self.status = 'waiting_ollama'
+            self.last_error = problem
+        self.stop_event.wait(self.ERROR_BACKOFF_SECONDS)
+
+    def _record_failure(self, item, returncode):
+        """
+        Si Ollama dejó de estar disponible, el fichero no tiene la culpa: vuelve
+        al principio de la cola sin gastar intento. Si no, cuenta un intento y
+        solo tras MAX_ATTEMPTS queda en 'failed' (hasta retry_failed()).
+        """
+        problem = self.ollama_problem()
+        with self.lock:
+            if problem:
+                self.queue.insert(0, item)
+                self.status = 'waiting_ollama'
+                self.last_error = problem
+                print(f"⏳ Backlog en espera ({problem}), se reintentará: {item['source']}")
+                return
+            output = item['output']
+            attempts = self.state['attempts'].get(output, 0) + 1
+            if attempts >= self.MAX_ATTEMPTS:
+                self.state['attempts'].pop(output, None)
+                self.state['failed'][output] = returncode
+            else:
+                self.state['attempts'][output] = attempts
+                self.queue.append(item)
+            self._save_state()
+            self.status = 'error'
+            self.last_error = f"Falló con código {returncode} (intento {attempts}/{self.MAX_ATTEMPTS}): {item['source']}"
+        print(f"❌ Backlog falló ({returncode}, intento {attempts}/{self.MAX_ATTEMPTS}): {item['source']}")
+
+    def _next_item(self):
+        if not self.queue and time.time() - self.last_scan > self.RESCAN_SECONDS:
+            self._set_status('scanning')
+            items = self.pending()
+            with self.lock:
+                self.last_scan = time.time()
+                self.queue = [i for i in items if i['output'] not in self.state['failed']]
+            print(f"🗂️  Backlog: {len(self.queue)} traducciones pendientes")
+
+        with self.lock:
+            while self.queue:
+                item = self.queue.pop(0)
+                # Puede haberse traducido a mano desde el último escaneo
+                if not os.path.exists(item['output']):
+                    return item
+        return None
+
+    def _translate(self, item):
+        cmd = ['bash', '-u', self.translate_script, item['source'], '--lang', item['lang'],
+               '--model', self.state['model'], '--no-debug']
+        with self.lock:
+            self.status = 'running'
+            self.current = item
+            self.progress = 0
+            self.state['current'] = item
+            self._save_state()
+        print(f"🗂️  Backlog → {item['output']}")
+
+        self.process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            cwd=os.path.dirname(self.translate_script),
+            preexec_fn=lambda: os.nice(19),
+            # Grupo propio: las señales tienen que llegar al python que lanza translate.sh, no solo a bash
+            start_new_session=True
+        )
+        reader = threading.Thread(target=self._read_output, args=(self.process,), daemon=True)
+        reader.start()
+
+        # Mientras traduce: si alguien más usa la GPU, se congela el proceso hasta que quede libre
+        while self.process.poll() is None:
+            busy = self.gpu_busy()
+            if busy and not self.paused:
+                self._signal(signal.SIGSTOP)
+                self.paused = True
+                self._set_status('throttled')
+            elif not busy and self.paused:
+                self._signal(signal.SIGCONT)
+                self.paused = False
+                self._set_status('running')
+            self.stop_event.wait(self.POLL_SECONDS)
+        reader.join(timeout=5)
+
+        with self.lock:
+            returncode = self.process.returncode
+            if returncode == 0:
+                self.state['done'] += 1
+                self.state['attempts'].pop(item['output'], None)
+            self.state['current'] = None
+            self.current = None
+            self.process = None
+            self.paused = False
+            self._save_state()
+        return returncode
+
+    def _read_output(self, process):
+        for line in process.stdout:
+            match = re.search(r'(\d+)%\|', line)
+            if match:
+                with self.lock:
+                    self.progress = int(match.group(1))
+
+    def _signal(self, sig, process=None):
+        process = process or self.process
+        if process and process.poll() is None:
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def _terminate(self):
+        process = self.process
+        if process and process.poll() is None:
+            if self.paused:
+                self._signal(signal.SIGCONT, process)
+            self._signal(signal.SIGTERM, process)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the post-processing pipelines in postprocess.py
+
+Checks every corpus entry against its expected cleaned output, then times the
+pipelines alone (no Ollama, no I/O) and, for reference, the pre-pipeline
+inline cleanup that used to live in translate_text.
+
+  python bench/bench_postprocess.py
+  python bench/bench_postprocess.py --corpus my_outputs.jsonl --iterations 5000
+
+Corpus format: one JSON object per line with "lang", "raw" (the model response
+as returned by Ollama) and optionally "expected" (the cleaned text).
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from postprocess import clean_translation  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'postprocess_corpus.jsonl')
+
+
+def legacy_clean(translation: str, target_lang: str) -> str:
+    """The cleanup as it was inlined in translate_text before postprocess.py (baseline only)."""
+    translation = translation.strip()
+    translation = re.sub(r'<think(?:ing)?>.*?</think(?:ing)?>', '', translation, flags=re.DOTALL | re.IGNORECASE)
+    translation = re.sub(
+        r'^(?:Note|Translation|Nota|Traducción|Hinweis|Note de traduction|翻訳|翻译|번역|참고|メモ|Here(?:\s+is)?|Below\s+is|The\s+translation|I(?:\'ll|\s+will|\s+have)|Certainly|Sure|Of\s+course|As\s+requested)[^\n]*\n?',
+        '', translation, flags=re.MULTILINE | re.IGNORECASE
+    )
+    translation = re.sub(
+        r'^[\*\-]\s+(?:Note|Translation|Explanation|Alternative)[^\n]*\n?',
+        '', translation, flags=re.MULTILINE | re.IGNORECASE
+    )
+    translation = re.sub(r'^["\'](.+)["\']$', r'\1', translation.strip(), flags=re.DOTALL)
+    translation = re.sub(r'^[\uAC00-\uD7A3\s\u3131-\u318E\uFFA0-\uFFDC]+$', '', translation, flags=re.MULTILINE)
+    if target_lang not in ['ja', 'zh', 'ko']:
+        lines = translation.split('\n')
+        filtered = []
+        for line in lines:
+            cjk = len(re.findall(r'[\u4E00-\u9FFF\u3040-\u309F\u30A0-\u30FF\uAC00-\uD7A3]', line))
+            total = len(line.strip())
+            if total > 0 and (cjk / total) < 0.5:
+                filtered.append(line)
+            elif total == 0:
+                filtered.append(line)
+        translation = '\n'.join(filtered)
+    return re.sub(r'\n{3,}', '\n\n', translation.strip())
+
+
+def load_corpus(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check(corpus):
+    failures = []
+    for i, item in enumerate(corpus):
+        if 'expected' not in item:
+            continue
+        got = clean_translation(item['raw'], item['lang'])
+        if got != item['expected']:
+            failures.append((i, item, got))
+    return failures
+
+
+def time_cleaner(cleaner, corpus, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for item in corpus:
+            cleaner(item['raw'], item['lang'])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Post-processing micro-benchmark')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='JSONL corpus of model outputs')
+    parser.add_argument('--iterations', '-n', type=int, default=2000, help='Passes over the corpus')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    print(f"Corpus: {args.corpus} ({len(corpus)} responses)")
+
+    failures = check(corpus)
+    for i, item, got in failures:
+        print(f"  MISMATCH #{i} [{item['lang']}] raw={item['raw']!r}\n    expected={item['expected']!r}\n    got     ={got!r}")
+    print(f"Correctness: {len(corpus) - len(failures)}/{len(corpus)} match")
+
+    # Warm the regex caches so both sides are measured in steady state
+    time_cleaner(clean_translation, corpus, 1)
+    time_cleaner(legacy_clean, corpus, 1)
+
+    calls = len(corpus) * args.iterations
+    print(f"\n{'cleaner':<10} {'total s':>9} {'µs/response':>12} {'responses/s':>12}")
+    results = {}
+    for name, cleaner in (('pipeline', clean_translation), ('legacy', legacy_clean)):
+        elapsed = time_cleaner(cleaner, corpus, args.iterations)
+        results[name] = elapsed
+        print(f"{name:<10} {elapsed:>9.3f} {elapsed / calls * 1e6:>12.2f} {calls / elapsed:>12.0f}")
+    print(f"Speed-up: {results['legacy'] / results['pipeline']:.2f}x")
+
+    by_lang = defaultdict(list)
+    for item in corpus:
+        by_lang[item['lang']].append(item)
+    print(f"\n{'lang':<6} {'responses':>9} {'µs/response':>12}")
+    for lang, items in sorted(by_lang.items()):
+        elapsed = time_cleaner(clean_translation, items, args.iterations)
+        print(f"{lang:<6} {len(items):>9} {elapsed / (len(items) * args.iterations) * 1e6:>12.2f}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,301 @@
+"""
+Cola de traducciones de la UI. Un único worker ejecuta los trabajos de uno en
+uno (la GPU es una sola) y, entre los que esperan, elige primero los del
+modelo que Ollama ya tiene cargado para aprovechar cada carga al máximo.
+"""
+
+import itertools
+import json
+import os
+import queue
+import re
+import signal
+import subprocess
+import threading
+import time
+
+import requests
+
+from subtitle_translator import generate_output_filename
+
+# keep_alive mientras quedan trabajos del mismo modelo en cola / cuando es el último.
+# El del último no es el de Ollama (5m): entre traducción y traducción a mano suelen pasar más
+# de 5 minutos y el siguiente trabajo volvería a pagar la carga. Al cambiar de modelo se descarga igual.
+QUEUE_KEEP_ALIVE = os.getenv('OLLAMA_QUEUE_KEEP_ALIVE', '30m')
+IDLE_KEEP_ALIVE = os.getenv('OLLAMA_IDLE_KEEP_ALIVE', '30m')
+# Un trabajo de otro modelo no espera más de esto aunque sigan llegando del modelo cargado
+MAX_WAIT_SECONDS = int(os.getenv('JOB_MAX_WAIT', '900'))
+MAX_FINISHED_JOBS = 50
+TRACE_DIR = os.getenv('TRACE_DIR', '/tmp/subtranslator-traces')
+
+
+class Job:
+    def __init__(self, job_id, cmd, file_path, lang, model, trace=False):
+        self.id = job_id
+        self.cmd = cmd
+        self.file_path = file_path
+        self.lang = lang
+        self.model = model
+        self.status = 'queued'
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.load_seconds = None
+        self.translate_seconds = None
+        self.output_file = None
+        self.trace_path = os.path.join(TRACE_DIR, f'job-{job_id}.json') if trace else None
+        self.process = None
+        self.cancel_requested = False
+        self.events = []
+        self.subscribers = []
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'path': self.file_path,
+            'lang': self.lang,
+            'model': self.model,
+            'status': self.status,
+            'cancelling': self.cancel_requested and self.status == 'running',
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'load_seconds': self.load_seconds,
+            'translate_seconds': self.translate_seconds,
+            'output_file': self.output_file,
+            'trace': self.trace_path is not None,
+        }
+
+
+class JobQueue:
+    def __init__(self, ollama_host, work_dir):
+        self.ollama_host = ollama_host
+        self.work_dir = work_dir
+        self.jobs = {}
+        self.lock = threading.Condition()
+        self.ids = itertools.count(1)
+        self.last_model = None
+        self.thread = threading.Thread(target=self._run, name='job-queue', daemon=True)
+        self.thread.start()
+
+    # ---------- API pública ----------
+    def submit(self, cmd, file_path, lang, model, trace=False):
+        with self.lock:
+            job = Job(str(next(self.ids)), cmd, file_path, lang, model, trace)
+            self.jobs[job.id] = job
+            position = len(self._queued())
+            self._emit(job, {'type': 'job', 'id': job.id})
+            if position > 1 or self._running():
+                self._emit(job, {'type': 'log', 'message': f'En cola (posición {position}, modelo {model})'})
+            self.lock.notify_all()
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def busy(self):
+        with self.lock:
+            return self._running() is not None or bool(self._queued())
+
+    def subscribe(self, job):
+        """Cola con el historial de eventos del trabajo seguido de los nuevos."""
+        q = queue.Queue()
+        with self.lock:
+            for event in job.events:
+                q.put(event)
+            if job.status in ('queued', 'running'):
+                job.subscribers.append(q)
+            else:
+                q.put(None)
+        return q
+
+    def unsubscribe(self, job, q):
+        """Si era el último cliente mirando un trabajo activo, nadie lo quiere ya: se cancela."""
+        with self.lock:
+            if q in job.subscribers:
+                job.subscribers.remove(q)
+            if not job.subscribers and job.status in ('queued', 'running'):
+                self.cancel(job.id, 'cliente desconectado')
+
+    def cancel(self, job_id, reason='cancelado por el usuario'):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status not in ('queued', 'running'):
+                return job
+            print(f"🛑 Cancelando trabajo {job.id} ({reason})")
+            if job.status == 'queued':
+                self._finish(job, 'cancelled', {'type': 'error', 'message': f'Traducción cancelada ({reason})',
+                                                'cancelled': True})
+                return job
+            job.cancel_requested = True
+            self._kill(job)
+            return job
+
+    # ---------- planificación ----------
+    def _queued(self):
+        return [job for job in self.jobs.values() if job.status == 'queued']
+
+    def _running(self):
+        return next((job for job in self.jobs.values() if job.status == 'running'), None)
+
+    def _resident_models(self):
+        try:
+            response = requests.get(f'{self.ollama_host}/api/ps', timeout=5)
+            return [m.get('name', '') for m in response.json().get('models', [])]
+        except Exception:
+            return [self.last_model] if self.last_model else []
+
+    def _pick(self, queued, resident):
+        oldest = queued[0]
+        if time.time() - oldest.submitted > MAX_WAIT_SECONDS:
+            return oldest
+        for model in [self.last_model] + resident:
+            same_model = [job for job in queued if job.model == model]
+            if same_model:
+                return same_model[0]
+        return oldest
+
+    def _unload(self, model):
+        """Libera la VRAM del modelo anterior en lugar de esperar a que caduque su keep_alive."""
+        try:
+            requests.post(f'{self.ollama_host}/api/generate', json={'model': model, 'keep_alive': 0}, timeout=30)
+            print(f"🧹 Modelo descargado: {model}")
+        except Exception as e:
+            print(f"⚠️  No se pudo descargar {model}: {e}")
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self._queued():
+                    self.lock.wait()
+            resident = self._resident_models()
+
+            with self.lock:
+                queued = self._queued()
+                job = self._pick(queued, resident)
+                more_same_model = any(j is not job and j.model == job.model for j in queued)
+                job.status = 'running'
+                job.started = time.time()
+
+            if self.last_model and self.last_model != job.model:
+                self._unload(self.last_model)
+            self.last_model = job.model
+
+            keep_alive = QUEUE_KEEP_ALIVE if more_same_model else IDLE_KEEP_ALIVE
+            cmd = job.cmd + ['--keep-alive', keep_alive]
+            if job.trace_path:
+                cmd += ['--trace', job.trace_path]
+            self._execute(job, cmd)
+            self._prune()
+
+    def _kill(self, job):
+        # SIGTERM al grupo entero: el traductor guarda el parcial y aborta la petición a Ollama en curso
+        if job.process and job.process.poll() is None:
+            try:
+                os.killpg(job.process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _execute(self, job, cmd):
+        try:
+            if job.trace_path:
+                os.makedirs(TRACE_DIR, exist_ok=True)
+            with self.lock:
+                job.process = subprocess.Popen(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    bufsize=1,
+                    universal_newlines=True,
+                    cwd=self.work_dir,
+                    start_new_session=True
+                )
+                if job.cancel_requested:
+                    self._kill(job)
+
+            print("Traducción iniciada con Ollama...")
+            self._publish(job, {'type': 'log', 'message': 'Traducción iniciada con Ollama...'})
+            self._publish(job, {'type': 'progress', 'percent': 0})
+
+            for line in job.process.stdout:
+                line = line.rstrip('\n')
+                if not line:
+                    continue
+                print(line)
+                self._publish(job, {'type': 'log', 'message': line})
+
+                match = re.search(r'(\d+)%\|', line)
+                if match:
+                    self._publish(job, {'type': 'progress', 'percent': int(match.group(1))})
+                    continue
+                # Tiempo de carga del modelo separado del de traducción
+                match = re.match(r'Timing: load ([\d.]+)s, translation ([\d.]+)s', line)
+                if match:
+                    job.load_seconds = float(match.group(1))
+                    job.translate_seconds = float(match.group(2))
+
+            job.process.wait()
+
+            if job.cancel_requested:
+                partial_file = generate_output_filename(job.file_path, job.lang) + '.partial'
+                event = {'type': 'error', 'message': 'Traducción cancelada', 'cancelled': True}
+                if os.path.exists(partial_file):
+                    event['partial_file'] = partial_file
+                print(f"🛑 Trabajo {job.id} cancelado")
+                self._finish(job, 'cancelled', event)
+            elif job.process.returncode == 0:
+                job.output_file = generate_output_filename(job.file_path, job.lang)
+                print('¡Traducción completada!')
+                print(f'Archivo generado: {job.output_file}')
+                self._publish(job, {'type': 'log', 'message': '¡Traducción completada!'})
+                self._publish(job, {'type': 'progress', 'percent': 100})
+                self._finish(job, 'done', {'type': 'complete', 'output_file': job.output_file,
+                                           'load_seconds': job.load_seconds,
+                                           'translate_seconds': job.translate_seconds})
+            else:
+                print(f"Falló con código {job.process.returncode}")
+                self._finish(job, 'error', {'type': 'error', 'message': f'Falló con código {job.process.returncode}'})
+        except Exception as e:
+            print(f"Error: {e}")
+            self._finish(job, 'error', {'type': 'error', 'message': str(e)})
+
+    # ---------- eventos ----------
+    def _emit(self, job, event):
+        job.events.append(event)
+        for q in job.subscribers:
+            q.put(event)
+
+    def _publish(self, job, event):
+        with self.lock:
+            self._emit(job, event)
+
+    def _finish(self, job, status, event):
+        with self.lock:
+            self._emit(job, event)
+            job.status = status
+            job.finished = time.time()
+            job.process = None
+            for q in job.subscribers:
+                q.put(None)
+            job.subscribers = []
+
+    def _prune(self):
+        with self.lock:
+            finished = [job for job in self.jobs.values() if job.status not in ('queued', 'running')]
+            for job in finished[:-MAX_FINISHED_JOBS]:
+                del self.jobs[job.id]
+                if job.trace_path and os.path.exists(job.trace_path):
+                    try:
+                        os.remove(job.trace_path)
+                    except OSError as e:
+                        print(f"⚠️  No se pudo borrar la traza {job.trace_path}: {e}")
+
+
+def sse(event):
+    return f"data: {json.dumps(event)}\n\n"
@@ -0,0 +1,129 @@
+"""
+Post-processing of raw model output - compiled, per-language cleanup pipelines
+"""
+
+import re
+from typing import Callable, Dict, Iterable, List
+
+Rule = Callable[[str], str]
+
+ASIAN_LANGS = ('ja', 'zh', 'ko')
+
+# Gemma4 thinking/reasoning blocks: <think>...</think> or <thinking>...</thinking>
+THINK_BLOCK = re.compile(r'<think(?:ing)?>.*?</think(?:ing)?>', re.DOTALL | re.IGNORECASE)
+
+# Meta-commentary lines (Note:, Here is..., Translation:, etc.) and explanatory bullet points, in one pass.
+# Whole words only: "Heredaste la casa." or "Notaste algo raro?" are dialogue, not a note
+META_LINE = re.compile(
+    r'^(?:'
+    r'(?:Note|Translation|Nota|Traducción|Hinweis|Note de traduction|翻訳|翻译|번역|참고|メモ|Here(?:\s+is)?|Below\s+is|'
+    r'The\s+translation|I(?:\'ll|\s+will|\s+have)|Certainly|Sure|Of\s+course|As\s+requested)\b'
+    r'|[\*\-]\s+(?:Note|Translation|Explanation|Alternative)\b'
+    r')[^\n]*\n?',
+    re.MULTILINE | re.IGNORECASE
+)
+
+# English targets: the same words are ordinary dialogue ("I'll be right back.", "Note the time."),
+# so only strip them when they read as commentary - a "Label:" note, a line introducing the
+# translation, or a lone preamble followed by a blank line (a cue can never contain one)
+EN_PREAMBLE = re.compile(r'\A(?:Sure|Certainly|Of\s+course|Absolutely|Okay|OK)\b[^\n]*\n[ \t]*\n', re.IGNORECASE)
+EN_COMMENTARY_LINE = re.compile(
+    r'^(?:'
+    r'(?:[\*\-]\s+)?(?:Note|Explanation|Alternatives?|Translator\'s\s+note)\s*:[^\n]*'
+    r'|[^\n]*\btranslat\w*\b[^\n]*:[ \t]*'
+    r')(?:\n|$)',
+    re.MULTILINE | re.IGNORECASE
+)
+EN_TRANSLATION_LABEL = re.compile(r'^Translation\s*:[ \t]*', re.MULTILINE | re.IGNORECASE)
+
+# Only a matching pair: no other double quote inside ("A."\n"B." stays as is), and single
+# quotes only as apostrophes between letters ('I don't know.', 'C'est la vie.')
+QUOTE_WRAPPER = re.compile(r'^(?:"([^"]+)"|\'((?:[^\']|(?<=\w)\'(?=\w))+)\')$')
+KOREAN_LINE = re.compile(r'^[\uAC00-\uD7A3\s\u3131-\u318E\uFFA0-\uFFDC]+$', re.MULTILINE)
+CJK_CHAR = re.compile(r'[\u4E00-\u9FFF\u3040-\u309F\u30A0-\u30FF\uAC00-\uD7A3]')
+BLANK_RUNS = re.compile(r'\n{3,}')
+
+
+def strip_thinking(text: str) -> str:
+    return THINK_BLOCK.sub('', text)
+
+
+def strip_meta_lines(text: str) -> str:
+    return META_LINE.sub('', text)
+
+
+def strip_english_commentary(text: str) -> str:
+    text = EN_PREAMBLE.sub('', text)
+    text = EN_COMMENTARY_LINE.sub('', text)
+    return EN_TRANSLATION_LABEL.sub('', text)
+
+
+def strip_quote_wrapper(text: str) -> str:
+    return QUOTE_WRAPPER.sub(lambda m: m.group(1) or m.group(2), text.strip())
+
+
+def strip_korean_lines(text: str) -> str:
+    return KOREAN_LINE.sub('', text)
+
+
+def drop_cjk_lines(text: str) -> str:
+    """Drop lines that are mostly CJK - leaked source/other-language text in a non-Asian target."""
+    if not CJK_CHAR.search(text):
+        return text
+    filtered = []
+    for line in text.split('\n'):
+        total = len(line.strip())
+        if total == 0 or len(CJK_CHAR.findall(line)) / total < 0.5:
+            filtered.append(line)
+    return '\n'.join(filtered)
+
+
+def collapse_blank_lines(text: str) -> str:
+    return BLANK_RUNS.sub('\n\n', text.strip())
+
+
+class CleanupPipeline:
+    """An ordered list of str -> str rules applied to every model response."""
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules: List[Rule] = list(rules)
+
+    def __call__(self, text: str) -> str:
+        text = text.strip()
+        for rule in self.rules:
+            text = rule(text)
+        return text
+
+    def extended(self, *rules: Rule, before: Rule = None) -> 'CleanupPipeline':
+        """New pipeline with extra rules appended, or inserted in front of an existing one."""
+        new_rules = list(self.rules)
+        position = new_rules.index(before) if before else len(new_rules)
+        new_rules[position:position] = rules
+        return CleanupPipeline(new_rules)
+
+
+COMMON_RULES = [strip_thinking, strip_meta_lines, strip_quote_wrapper]
+
+DEFAULT_PIPELINE = CleanupPipeline(COMMON_RULES + [strip_korean_lines, drop_cjk_lines, collapse_blank_lines])
+
+PIPELINES: Dict[str, CleanupPipeline] = {
+    # The generic meta-commentary rule would eat English dialogue
+    'en': CleanupPipeline([strip_thinking, strip_english_commentary, strip_quote_wrapper,
+                           strip_korean_lines, drop_cjk_lines, collapse_blank_lines]),
+    'ja': CleanupPipeline(COMMON_RULES + [strip_korean_lines, collapse_blank_lines]),
+    'zh': CleanupPipeline(COMMON_RULES + [strip_korean_lines, collapse_blank_lines]),
+    # Korean output must keep its Hangul lines
+    'ko': CleanupPipeline(COMMON_RULES + [collapse_blank_lines]),
+}
+
+
+def register_pipeline(lang: str, pipeline: CleanupPipeline):
+    PIPELINES[lang] = pipeline
+
+
+def get_pipeline(lang: str) -> CleanupPipeline:
+    return PIPELINES.get(lang, DEFAULT_PIPELINE)
+
+
+def clean_translation(text: str, target_lang: str) -> str:
+    return get_pipeline(target_lang)(text)
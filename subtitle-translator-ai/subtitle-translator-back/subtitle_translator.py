@@ -4,14 +4,22 @@ Subtitle Translator using Ollama - with beautiful progress bar and context suppo
 """
 
 import argparse
+import difflib
+import hashlib
+import json
 import os
 import re
 import requests
+import signal
 import time
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Set, Tuple
 from dotenv import load_dotenv
 
+from postprocess import clean_translation
+from tracing import NO_TRACE, Tracer
+
 load_dotenv()
 
 OLLAMA_HOST_URL = os.getenv("OLLAMA_HOST")
@@ -29,6 +37,28 @@ MEDIA_BASE = "Media"
 # Debug flag
 DEBUG = True
 
+LANG_NAMES = {
+    'en': 'English', 'es': 'Spanish', 'fr': 'French', 'de': 'German',
+    'it': 'Italian', 'pt': 'Portuguese', 'ja': 'Japanese', 'zh': 'Chinese',
+    'ko': 'Korean', 'ru': 'Russian', 'ar': 'Arabic'
+}
+
+# Language-specific guidelines
+LANG_GUIDELINES = {
+    'ja': """
+For Japanese:
+- Use natural sentence structure
+- Use Hiragana, Katakana, and Kanji appropriately
+- Match politeness level to context
+""",
+    'es': """
+For Spanish:
+- Use natural, conversational Latin American Spanish
+- Use correct accent marks (á, é, í, ó, ú, ñ)
+- Match formality (tú/usted) to relationships
+""",
+}
+
 
 def debug_print(message: str):
     if DEBUG:
@@ -36,6 +66,17 @@ def debug_print(message: str):
         print(f"[DEBUG {timestamp}] {message}", flush=True)
 
 
+class TranslationCancelled(BaseException):
+    """Raised from the SIGTERM/SIGINT handler; BaseException so translate_text's catch-all does not swallow it."""
+
+
+def _cancel_handler(signum, frame):
+    # Stop dispatching and abort the in-flight request; further signals are ignored during cleanup
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    raise TranslationCancelled(signal.Signals(signum).name)
+
+
 class SubtitleEntry:
     def __init__(self, index: int, timestamp: str, text: str):
         self.index = index
@@ -61,6 +102,181 @@ def parse_srt(content: str) -> List[SubtitleEntry]:
     return entries
 
 
+def read_srt(path: str) -> List[SubtitleEntry]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_srt(f.read())
+
+
+def write_srt(path: str, entries: List[SubtitleEntry]):
+    """Write via a temp file + rename so readers never see a half-written subtitle."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for e in entries:
+            f.write(f"{e.index}\n{e.timestamp}\n{e.text}\n\n")
+    os.replace(tmp_path, path)
+
+
+def _sha1(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _cue_key(entry: SubtitleEntry) -> str:
+    return f"{entry.index}|{entry.timestamp}"
+
+
+def failed_entries_path(output_path: str) -> str:
+    return re.sub(r'\.srt$', '', output_path) + '.failed.json'
+
+
+def read_failed_entries(output_path: str) -> Set[str]:
+    """Cues of a translated file that kept their source text because translate_text failed."""
+    try:
+        with open(failed_entries_path(output_path), 'r', encoding='utf-8') as f:
+            return set(json.load(f))
+    except (OSError, ValueError):
+        return set()
+
+
+def write_failed_entries(output_path: str, failed: List[str]):
+    path = failed_entries_path(output_path)
+    if not failed:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(failed, f)
+
+
+def partial_fingerprint(target_lang: str, model: str, context: str = None) -> str:
+    """A partial is only reusable by a run with the same language, model and context."""
+    return _sha1(json.dumps([target_lang, model, context or ''], ensure_ascii=False))
+
+
+def discard_partial(partial_path: str):
+    for path in (partial_path, partial_path + '.json'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def save_partial(partial_path: str, translated: List[SubtitleEntry], sources: List[SubtitleEntry], fingerprint: str,
+                 failed: List[str] = ()):
+    """
+    The partial SRT plus a sidecar with the run fingerprint, a hash of each
+    cue's source text and the cues whose translation failed.
+    """
+    write_srt(partial_path, translated)
+    meta = {
+        'fingerprint': fingerprint,
+        'cues': {_cue_key(e): _sha1(normalize_cue_text(e.text)) for e in sources},
+        'failed': list(failed),
+    }
+    tmp_path = partial_path + '.json.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, partial_path + '.json')
+
+
+def load_partial(partial_path: str, entries: List[SubtitleEntry], fingerprint: str) -> List[Optional[str]]:
+    """
+    Translations saved by a cancelled run. A cue is reused only if its index,
+    timestamp and source text still match and it did not fail; a partial from a
+    run with another language/model/context (or without its sidecar) is discarded.
+    """
+    if not os.path.exists(partial_path):
+        return [None] * len(entries)
+    try:
+        with open(partial_path + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+    if meta.get('fingerprint') != fingerprint:
+        print(f"Discarding partial from a different run: {partial_path}", flush=True)
+        discard_partial(partial_path)
+        return [None] * len(entries)
+
+    saved = {(e.index, e.timestamp): e.text for e in read_srt(partial_path)}
+    cues = meta.get('cues', {})
+    failed = set(meta.get('failed', []))
+    resumed = []
+    for e in entries:
+        text = saved.get((e.index, e.timestamp))
+        key = _cue_key(e)
+        if text is not None and (key in failed or cues.get(key) != _sha1(normalize_cue_text(e.text))):
+            text = None
+        resumed.append(text)
+    return resumed
+
+
+def normalize_cue_text(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def align_with_previous(entries: List[SubtitleEntry], previous_source: List[SubtitleEntry],
+                        previous_target: List[SubtitleEntry],
+                        previous_failed: Set[str] = frozenset()) -> Tuple[List[Optional[str]], dict]:
+    """
+    Align the new source against the previous source/target pair by cue text,
+    falling back to timestamps for edited lines. Returns one carried-over
+    translation per new entry (None = needs translating) and a change report.
+    previous_failed holds the target cues recorded as failed by the previous run.
+    """
+    target_by_index = {e.index: e for e in previous_target}
+    target_by_timestamp = {e.timestamp: e for e in previous_target}
+
+    def previous_translation(old: SubtitleEntry) -> Optional[str]:
+        match = target_by_index.get(old.index)
+        if match is None or match.timestamp != old.timestamp:
+            match = target_by_timestamp.get(old.timestamp, match)
+        if match is None or _cue_key(match) in previous_failed:
+            return None
+        return match.text
+
+    carried = [None] * len(entries)
+    report = {'unchanged': [], 'retimed': [], 'changed': [], 'added': [], 'removed': [], 'missing_translation': []}
+
+    matcher = difflib.SequenceMatcher(
+        None,
+        [normalize_cue_text(e.text) for e in previous_source],
+        [normalize_cue_text(e.text) for e in entries],
+        autojunk=False
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            for old, j in zip(previous_source[i1:i2], range(j1, j2)):
+                new = entries[j]
+                carried[j] = previous_translation(old)
+                if carried[j] is None:
+                    report['missing_translation'].append(new.index)
+                elif old.timestamp == new.timestamp:
+                    report['unchanged'].append(new.index)
+                else:
+                    report['retimed'].append({'index': new.index, 'from': old.timestamp, 'to': new.timestamp})
+            continue
+
+        # Edited region: pair cues that kept their timing, the rest are added/removed
+        old_by_timestamp = {e.timestamp: e for e in previous_source[i1:i2]}
+        paired = set()
+        for new in entries[j1:j2]:
+            old = old_by_timestamp.get(new.timestamp)
+            if old is not None and old.timestamp not in paired:
+                paired.add(old.timestamp)
+                report['changed'].append({'index': new.index, 'from': old.text, 'to': new.text})
+            else:
+                report['added'].append({'index': new.index, 'timestamp': new.timestamp})
+        for old in previous_source[i1:i2]:
+            if old.timestamp not in paired:
+                report['removed'].append({'index': old.index, 'timestamp': old.timestamp, 'text': old.text})
+
+    return carried, report
+
+
+def write_diff_report(report: dict, report_path: str):
+    summary = {key: len(value) for key, value in report.items()}
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, **report}, f, ensure_ascii=False, indent=2)
+    return summary
+
+
 def test_ollama_connection(model: str) -> bool:
     try:
         url = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}/api/tags"
@@ -76,16 +292,26 @@ def test_ollama_connection(model: str) -> bool:
         return False
 
 
-def translate_text(text: str, target_lang: str, model: str, context: str = None, source_lang: str = "auto") -> str:
+def warm_up_model(model: str, keep_alive: str = None) -> float:
+    """Load the model before the first real entry (empty prompt) so the load cost is measured on its own."""
     url = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}/api/generate"
-    
-    lang_names = {
-        'en': 'English', 'es': 'Spanish', 'fr': 'French', 'de': 'German',
-        'it': 'Italian', 'pt': 'Portuguese', 'ja': 'Japanese', 'zh': 'Chinese',
-        'ko': 'Korean', 'ru': 'Russian', 'ar': 'Arabic'
-    }
-    target_lang_name = lang_names.get(target_lang, target_lang)
-    
+    payload = {"model": model}
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    start = time.time()
+    try:
+        response = requests.post(url, json=payload, timeout=600)
+        response.raise_for_status()
+    except Exception as e:
+        debug_print(f"Warm-up error: {e}")
+    return time.time() - start
+
+
+@lru_cache(maxsize=32)
+def build_prompt_prefix(target_lang: str, context: str = None) -> str:
+    """Everything in the prompt before the subtitle text - identical for every entry of a run."""
+    target_lang_name = LANG_NAMES.get(target_lang, target_lang)
+
     # Build context section
     context_section = ""
     if context:
@@ -95,30 +321,21 @@ CONTEXT: {context}
 Use this context to inform your translation for character names, tone, and terminology.
 
 """
-    
-    # Language-specific guidelines
-    lang_guidelines = ""
-    if target_lang == 'ja':
-        lang_guidelines = """
-For Japanese:
-- Use natural sentence structure
-- Use Hiragana, Katakana, and Kanji appropriately
-- Match politeness level to context
-"""
-    elif target_lang == 'es':
-        lang_guidelines = """
-For Spanish:
-- Use natural, conversational Latin American Spanish
-- Use correct accent marks (á, é, í, ó, ú, ñ)
-- Match formality (tú/usted) to relationships
-"""
-    
+
     # Use Gemma native chat format to suppress thinking/reasoning output
-    prompt = f"""<start_of_turn>user
+    return f"""<start_of_turn>user
 Translate the following subtitle text to {target_lang_name}. Output ONLY the translated text. Do not think out loud. Do not add notes, explanations, alternatives, or any commentary. Do not include the original text. Do not use tags like <think> or <answer>. Just output the raw translation.
-{context_section}{lang_guidelines}
+{context_section}{LANG_GUIDELINES.get(target_lang, "")}
 Subtitle text:
-{text}
+"""
+
+
+def translate_text(text: str, target_lang: str, model: str, context: str = None, source_lang: str = "auto",
+                   keep_alive: str = None, stats: dict = None, tracer: Tracer = None) -> str:
+    tracer = tracer or NO_TRACE
+    span_start = tracer.now()
+    url = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}/api/generate"
+    prompt = f"""{build_prompt_prefix(target_lang, context)}{text}
 <end_of_turn>
 <start_of_turn>model
 """
@@ -129,50 +346,27 @@ Subtitle text:
         "stream": False,
         "options": {"temperature": 0.1, "top_p": 0.8, "num_predict": 500}
     }
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    tracer.add('prompt build', span_start)
 
     try:
+        span_start = tracer.now()
         response = requests.post(url, json=payload, timeout=180)
         response.raise_for_status()
-        translation = response.json().get('response', '').strip()
-        
-        # Strip gemma4 thinking/reasoning blocks: <think>...</think> or <thinking>...</thinking>
-        translation = re.sub(r'<think(?:ing)?>.*?</think(?:ing)?>', '', translation, flags=re.DOTALL | re.IGNORECASE)
-        
-        # Strip meta-commentary lines (Note:, Here is..., Translation:, etc.)
-        translation = re.sub(
-            r'^(?:Note|Translation|Nota|Traducción|Hinweis|Note de traduction|翻訳|翻译|번역|참고|メモ|Here(?:\s+is)?|Below\s+is|The\s+translation|I(?:\'ll|\s+will|\s+have)|Certainly|Sure|Of\s+course|As\s+requested)[^\n]*\n?',
-            '', translation, flags=re.MULTILINE | re.IGNORECASE
-        )
-        
-        # Strip explanatory bullet points
-        translation = re.sub(
-            r'^[\*\-]\s+(?:Note|Translation|Explanation|Alternative)[^\n]*\n?',
-            '', translation, flags=re.MULTILINE | re.IGNORECASE
-        )
-        
-        # Remove quote wrappers
-        translation = re.sub(r'^["\'](.+)["\']$', r'\1', translation.strip(), flags=re.DOTALL)
-        
-        # Remove pure Korean lines
-        translation = re.sub(r'^[\uAC00-\uD7A3\s\u3131-\u318E\uFFA0-\uFFDC]+$', '', translation, flags=re.MULTILINE)
-        
-        # Filter CJK for non-Asian target languages
-        if target_lang not in ['ja', 'zh', 'ko']:
-            lines = translation.split('\n')
-            filtered = []
-            for line in lines:
-                cjk = len(re.findall(r'[\u4E00-\u9FFF\u3040-\u309F\u30A0-\u30FF\uAC00-\uD7A3]', line))
-                total = len(line.strip())
-                if total > 0 and (cjk / total) < 0.5:
-                    filtered.append(line)
-                elif total == 0:
-                    filtered.append(line)
-            translation = '\n'.join(filtered)
-        
-        translation = re.sub(r'\n{3,}', '\n\n', translation.strip())
+        data = response.json()
+        tracer.add_request(span_start, tracer.now(), data)
+        if stats is not None:
+            # Ollama reports durations in nanoseconds; a non-trivial load_duration means the model was reloaded
+            stats['load_seconds'] = stats.get('load_seconds', 0.0) + data.get('load_duration', 0) / 1e9
+        span_start = tracer.now()
+        translation = clean_translation(data.get('response', ''), target_lang)
+        tracer.add('post-process', span_start)
         return translation
     except Exception as e:
         debug_print(f"Translation error: {e}")
+        if stats is not None:
+            stats['failed'] = stats.get('failed', 0) + 1
         return text
 
 
@@ -211,7 +405,10 @@ def generate_output_filename(input_path: str, target_lang: str) -> str:
     return output_path
 
 
-def translate_subtitle_file(input_path: str, target_lang: str, model: str, max_entries: int = None, context: str = None):
+def translate_subtitle_file(input_path: str, target_lang: str, model: str, max_entries: int = None, context: str = None,
+                            previous_source: str = None, previous_target: str = None, keep_alive: str = None,
+                            tracer: Tracer = None):
+    tracer = tracer or NO_TRACE
     print(f"\n{'='*60}", flush=True)
     print(f"Subtitle Translation Started", flush=True)
     print(f"{'='*60}", flush=True)
@@ -220,53 +417,121 @@ def translate_subtitle_file(input_path: str, target_lang: str, model: str, max_e
     print(f"Model: {model}", flush=True)
     if context:
         print(f"Context: {context[:80]}{'...' if len(context) > 80 else ''}", flush=True)
+    if previous_source:
+        print(f"Diff from: {previous_source}", flush=True)
     print(f"{'='*60}\n", flush=True)
 
     if not test_ollama_connection(model):
         raise Exception("Model not available")
 
-    with open(input_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    with tracer.span('file read', path=input_path):
+        with open(input_path, 'r', encoding='utf-8') as f:
+            content = f.read()
 
-    entries = parse_srt(content)
+    with tracer.span('parse'):
+        entries = parse_srt(content)
     if max_entries:
         entries = entries[:max_entries]
         print(f"TEST MODE: First {max_entries} entries", flush=True)
 
+    output_path = generate_output_filename(input_path, target_lang)
+
+    carried = [None] * len(entries)
+    report = None
+    if previous_source:
+        previous_target = previous_target or output_path
+        if not os.path.exists(previous_target):
+            raise Exception(f"Previous translation not found: {previous_target}")
+        with tracer.span('diff align'):
+            carried, report = align_with_previous(entries, read_srt(previous_source), read_srt(previous_target),
+                                                  read_failed_entries(previous_target))
+
+    partial_path = output_path + '.partial'
+    fingerprint = partial_fingerprint(target_lang, model, context)
+    resumed = 0
+    for i, text in enumerate(load_partial(partial_path, entries, fingerprint)):
+        if text is not None and carried[i] is None:
+            carried[i] = text
+            resumed += 1
+
     total = len(entries)
+    pending = sum(1 for text in carried if text is None)
+    if report is not None:
+        print(f"Diff mode: {total - pending - resumed} carried over, {pending} to translate", flush=True)
+    if resumed:
+        print(f"Resuming: {resumed} entries from {partial_path}", flush=True)
     print(f"Translating {total} subtitles...\n", flush=True)
 
+    load_time = 0.0
+    if pending:
+        with tracer.span('model warm-up', model=model):
+            load_time = warm_up_model(model, keep_alive)
+        print(f"Model load: {load_time:.1f}s", flush=True)
+
     translated_entries = []
+    failed = []
+    stats = {}
     start_time = time.time()
 
-    for i, entry in enumerate(entries):
-        translated_text = translate_text(entry.text, target_lang, model, context)
-        translated_entries.append(SubtitleEntry(entry.index, entry.timestamp, translated_text))
-
-        # Emit tqdm-compatible progress line on every subtitle — app.py parses (\d+)%|
-        done = i + 1
-        pct = int(done * 100 / total)
-        elapsed = time.time() - start_time
-        rate = done / elapsed if elapsed > 0 else 0
-        remaining = (total - done) / rate if rate > 0 else 0
-        bar_filled = int(pct / 5)
-        bar = '█' * bar_filled + '░' * (20 - bar_filled)
-        print(
-            f"Translating: {pct:3d}%|{bar}| {done}/{total} "
-            f"[{int(elapsed//60):02d}:{int(elapsed%60):02d}<{int(remaining//60):02d}:{int(remaining%60):02d}, "
-            f"{rate:.2f}line/s]",
-            flush=True
-        )
+    try:
+        for i, entry in enumerate(entries):
+            translated_text = carried[i]
+            if translated_text is None:
+                entry_start = tracer.now()
+                failed_before = stats.get('failed', 0)
+                translated_text = translate_text(entry.text, target_lang, model, context,
+                                                 keep_alive=keep_alive, stats=stats, tracer=tracer)
+                if stats.get('failed', 0) > failed_before:
+                    failed.append(_cue_key(entry))
+                tracer.add(f"entry {entry.index}", entry_start, cat='entry',
+                           args={'index': entry.index, 'chars': len(entry.text)})
+            translated_entries.append(SubtitleEntry(entry.index, entry.timestamp, translated_text))
+
+            # Emit tqdm-compatible progress line on every subtitle — app.py parses (\d+)%|
+            done = i + 1
+            pct = int(done * 100 / total)
+            elapsed = time.time() - start_time
+            rate = done / elapsed if elapsed > 0 else 0
+            remaining = (total - done) / rate if rate > 0 else 0
+            bar_filled = int(pct / 5)
+            bar = '█' * bar_filled + '░' * (20 - bar_filled)
+            print(
+                f"Translating: {pct:3d}%|{bar}| {done}/{total} "
+                f"[{int(elapsed//60):02d}:{int(elapsed%60):02d}<{int(remaining//60):02d}:{int(remaining%60):02d}, "
+                f"{rate:.2f}line/s]",
+                flush=True
+            )
+    except TranslationCancelled:
+        # Keep what is done (carried-over cues included) so the next run resumes from here
+        if translated_entries:
+            save_partial(partial_path, translated_entries, entries[:len(translated_entries)], fingerprint, failed)
+        print(f"\n✗ Cancelled after {len(translated_entries)}/{total} entries", flush=True)
+        if translated_entries:
+            print(f"Partial saved: {partial_path}", flush=True)
+        raise
 
     total_time = time.time() - start_time
     print(f"\n✓ Complete! {total_time:.1f}s ({total_time/total:.2f}s per line)", flush=True)
-
-    output_path = generate_output_filename(input_path, target_lang)
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for e in translated_entries:
-            f.write(f"{e.index}\n{e.timestamp}\n{e.text}\n\n")
+    reload_time = stats.get('load_seconds', 0.0)
+    if reload_time >= 0.5:
+        print(f"Model reloaded during run: {reload_time:.1f}s of the translation time", flush=True)
+    print(f"Timing: load {load_time:.1f}s, translation {total_time:.1f}s", flush=True)
+    if failed:
+        print(f"⚠ {len(failed)} entries kept the source text (translation failed), retried on the next --diff-from run",
+              flush=True)
+
+    with tracer.span('file write', path=output_path):
+        write_srt(output_path, translated_entries)
+        write_failed_entries(output_path, failed)
+    discard_partial(partial_path)
 
     print(f"\nSaved: {output_path}", flush=True)
+
+    if report is not None:
+        report_path = re.sub(r'\.srt$', '.diff.json', output_path)
+        summary = write_diff_report(report, report_path)
+        print(f"Diff report: {report_path}", flush=True)
+        print("  " + ", ".join(f"{key}: {count}" for key, count in summary.items()), flush=True)
     print(f"{'='*60}\n", flush=True)
 
 
@@ -279,6 +544,8 @@ Examples:
   subtranslate movie.en.srt --lang ja
   subtranslate series.en.srt --lang ja --context "Horror series 1960s Maine"
   subtranslate file.srt --lang es --model gemma2:9b --test 10
+  subtranslate movie.en.srt --lang ja --diff-from old/movie.en.srt
+  subtranslate movie.en.srt --lang ja --test 20 --trace trace.json --profile
         """
     )
     parser.add_argument('path', help='Path to .srt file')
@@ -286,6 +553,15 @@ Examples:
     parser.add_argument('--model', '-m', default=DEFAULT_MODEL, help=f'Model (default: {DEFAULT_MODEL})')
     parser.add_argument('--test', '-t', type=int, metavar='N', help='Test: first N entries')
     parser.add_argument('--context', '-c', help='Movie/series description for context')
+    parser.add_argument('--diff-from', metavar='OLD_SRT',
+                        help='Previous version of the source; only new/changed cues are re-translated')
+    parser.add_argument('--previous-target', metavar='SRT',
+                        help='Previous translation to carry over (default: the existing output file)')
+    parser.add_argument('--keep-alive', metavar='DURATION',
+                        help='Ollama keep_alive for this run (e.g. 30m, -1); set by the job queue')
+    parser.add_argument('--trace', metavar='OUT_JSON',
+                        help='Write per-entry stage timings in Chrome trace-event format')
+    parser.add_argument('--profile', action='store_true', help='Run under cProfile and print the top functions')
     parser.add_argument('--no-debug', action='store_true', help='Disable debug')
 
     args = parser.parse_args()
@@ -297,15 +573,48 @@ Examples:
         print(f"Error: File not found: {full_path}")
         return 1
 
+    previous_source = None
+    if args.diff_from:
+        previous_source = build_network_path(args.diff_from)
+        if not os.path.exists(previous_source):
+            print(f"Error: File not found: {previous_source}")
+            return 1
+    previous_target = build_network_path(args.previous_target) if args.previous_target else None
+
+    signal.signal(signal.SIGTERM, _cancel_handler)
+    signal.signal(signal.SIGINT, _cancel_handler)
+
+    tracer = Tracer() if args.trace else None
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+
     try:
-        translate_subtitle_file(full_path, args.lang, args.model, args.test, args.context)
+        run_args = (full_path, args.lang, args.model, args.test, args.context,
+                    previous_source, previous_target, args.keep_alive, tracer)
+        if profiler:
+            profiler.runcall(translate_subtitle_file, *run_args)
+        else:
+            translate_subtitle_file(*run_args)
         return 0
+    except TranslationCancelled as e:
+        print(f"CANCELLED ({e})", flush=True)
+        return 130
     except Exception as e:
         print(f"ERROR: {e}")
         if DEBUG:
             import traceback
             traceback.print_exc()
         return 1
+    finally:
+        if tracer:
+            tracer.save(args.trace)
+            print(f"Trace: {args.trace}", flush=True)
+        if profiler:
+            import pstats
+            print(f"\n{'='*60}\nProfile (top 25 by cumulative time)\n{'='*60}", flush=True)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+"""
+Per-run trace recorder - writes Chrome trace-event JSON (chrome://tracing, Perfetto)
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+class Tracer:
+    """
+    Collects complete ("X") events. Spans recorded on the same thread id nest by
+    time in the viewer, so an entry span contains its prompt/HTTP/cleanup spans.
+    A disabled tracer ignores every call, so callers never need to check for one.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.events = []
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def add(self, name: str, start: float, end: Optional[float] = None, cat: str = 'stage', args: dict = None):
+        if not self.enabled:
+            return
+        end = self.now() if end is None else end
+        self.events.append({
+            'name': name,
+            'cat': cat,
+            'ph': 'X',
+            'ts': round((start - self.origin) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'pid': self.pid,
+            'tid': 1,
+            'args': args or {},
+        })
+
+    @contextmanager
+    def span(self, name: str, cat: str = 'stage', **args):
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add(name, start, cat=cat, args=args)
+
+    def add_request(self, http_start: float, http_end: float, data: dict):
+        """
+        Record the HTTP wait and lay Ollama's own timings (nanoseconds) out
+        inside it: load, then prompt eval (prefill), then eval (decoding).
+        Whatever is left of the wall time is network + queueing in Ollama.
+        """
+        if not self.enabled:
+            return
+        total = data.get('total_duration', 0) / 1e9
+        self.add('http wait', http_start, http_end, cat='http', args={
+            'prompt_tokens': data.get('prompt_eval_count', 0),
+            'output_tokens': data.get('eval_count', 0),
+            'network_ms': round(max(http_end - http_start - total, 0) * 1000, 1),
+        })
+        cursor = http_start
+        for key, name in (('load_duration', 'ollama load'),
+                          ('prompt_eval_duration', 'ollama prefill'),
+                          ('eval_duration', 'ollama decode')):
+            seconds = data.get(key, 0) / 1e9
+            if seconds <= 0 or cursor >= http_end:
+                continue
+            self.add(name, cursor, min(cursor + seconds, http_end), cat='ollama')
+            cursor += seconds
+
+    def save(self, path: str):
+        if not self.enabled:
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+NO_TRACE = Tracer(enabled=False)
@@ -31,6 +31,7 @@ export class HomeComponent implements OnInit, OnDestroy {
   outputFile: string | null = null;
 
   private eventSource: EventSource | null = null;
+  private jobId: string | null = null;
 
   constructor(private api: ApiService, private zone: NgZone, private cdr: ChangeDetectorRef) {}
 
@@ -103,6 +104,7 @@ export class HomeComponent implements OnInit, OnDestroy {
     this.translating = true;
     this.progress = 0;
     this.outputFile = null;
+    this.jobId = null;
     this.output += 'Iniciando traducción...\n\n';
 
     const params = new URLSearchParams();
@@ -119,7 +121,9 @@ export class HomeComponent implements OnInit, OnDestroy {
         const data = JSON.parse(event.data);
         console.log('[SSE onmessage] data:', data);
 
-        if (data.type === 'progress') {
+        if (data.type === 'job') {
+          this.jobId = data.id;
+        } else if (data.type === 'progress') {
           this.zone.run(() => {
             console.log('[SSE progress] updating to', data.percent, '%');
             this.progress = data.percent;
@@ -168,6 +172,21 @@ export class HomeComponent implements OnInit, OnDestroy {
     };
   }
 
+  stop(): void {
+    if (!this.jobId) {
+      this.closeEventSource();
+      this.translating = false;
+      return;
+    }
+    // El backend guarda el parcial; el evento de error/cancelación llega por el mismo EventSource
+    this.api.cancelJob(this.jobId).subscribe({
+      error: () => {
+        this.closeEventSource();
+        this.translating = false;
+      }
+    });
+  }
+
   private showSuccessModal(): void {
     const modalElement = document.getElementById('successModal');
     if (modalElement) {
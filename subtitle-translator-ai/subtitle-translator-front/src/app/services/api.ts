@@ -31,4 +31,8 @@ export class ApiService {
   translate(data: any): Observable<any> {
     return this.http.post(`${this.baseUrl}/translate`, data);
   }
+
+  cancelJob(jobId: string): Observable<any> {
+    return this.http.delete(`${this.baseUrl}/jobs/${jobId}`);
+  }
 }
\ No newline at end of file